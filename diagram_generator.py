@@ -1,5 +1,11 @@
+import json
+import logging
+from collections import OrderedDict, defaultdict
+from contextlib import nullcontext
+from functools import lru_cache
+from itertools import chain
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import yaml
 from diagrams import Diagram, Cluster
@@ -19,6 +25,17 @@ from diagrams.aws.general import General
 from models import Edge, Node
 
 
+# Use libyaml's C loader when available; it parses identically but much faster
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+logger = logging.getLogger(__name__)
+
+# Parsed-YAML cache shared across DiagramGenerator instances. The key binds
+# path, mtime and size so any change to the file invalidates its entry.
+_YAML_CACHE: "OrderedDict[Tuple[str, int, int], Tuple[list, list]]" = OrderedDict()
+_YAML_CACHE_SIZE = 32
+
+
 # Mapping of AWS resource types to diagram nodes
 RESOURCE_TO_NODE = {
     "aws_vpc": VPC,
@@ -33,7 +50,16 @@ RESOURCE_TO_NODE = {
     "provider": General  # Use AWS General icon for provider blocks
 }
 
+# Frozen (suffix, class) pairs for the base-type fallback in get_node_class,
+# computed once at import instead of splitting keys on every miss
+_SUFFIX_TABLE = tuple(
+    (key.split("_", 1)[1], value)
+    for key, value in RESOURCE_TO_NODE.items()
+    if "_" in key
+)
+
 
+@lru_cache(maxsize=None)
 def get_node_class(resource_type: str):
     """Get the appropriate diagram node class for a resource type."""
     # Handle provider blocks specially
@@ -46,8 +72,8 @@ def get_node_class(resource_type: str):
     
     # Try base type matching
     base_type = resource_type.split("_")[1]  # Remove 'aws_' prefix
-    for key, value in RESOURCE_TO_NODE.items():
-        if key.endswith(base_type):
+    for suffix, value in _SUFFIX_TABLE:
+        if suffix.endswith(base_type):
             return value
     return None
 
@@ -55,20 +81,59 @@ def get_node_class(resource_type: str):
 class DiagramGenerator:
     """Generates AWS architecture diagrams from YAML descriptions."""
 
-    def __init__(self, yaml_file: Path):
-        """Initialize with YAML file containing diagram description."""
+    def __init__(self, yaml_file: Path, include_edges: bool = True):
+        """Initialize with YAML file containing diagram description.
+
+        Callers that only need the structural node layout can pass
+        include_edges=False to skip materializing the edge list.
+        """
         if not yaml_file.exists():
             raise ValueError(f"YAML file not found: {yaml_file}")
 
-        with yaml_file.open() as f:
-            data = yaml.safe_load(f)
+        stats = yaml_file.stat()
+        cache_key = (str(yaml_file), stats.st_mtime_ns, stats.st_size)
+        cached = _YAML_CACHE.get(cache_key)
+        if cached is not None:
+            _YAML_CACHE.move_to_end(cache_key)
+            self.yaml_nodes, self.yaml_edges = list(cached[0]), list(cached[1])
+        else:
+            # Hand the parser one bytes buffer; .json files skip YAML
+            # entirely and go through the stdlib C decoder
+            if yaml_file.suffix == ".json":
+                data = json.loads(yaml_file.read_bytes())
+            else:
+                data = yaml.load(yaml_file.read_bytes(), Loader=Loader)
             if not data:
                 raise ValueError("Empty YAML file")
+            # Reject non-diagram documents before building any indexes
+            if not isinstance(data, dict) or ("nodes" not in data and "edges" not in data):
+                raise ValueError(
+                    f"Not a diagram file (no top-level 'nodes' or 'edges'): {yaml_file}"
+                )
 
             self.yaml_nodes = data.get("nodes", [])
             self.yaml_edges = data.get("edges", [])
-            self._node_map: Dict[str, object] = {}
-            self._cluster_map: Dict[str, Cluster] = {}
+            # Store shallow copies so a caller mutating this instance's
+            # lists can't poison the entry later generators will read
+            _YAML_CACHE[cache_key] = (list(self.yaml_nodes), list(self.yaml_edges))
+            if len(_YAML_CACHE) > _YAML_CACHE_SIZE:
+                _YAML_CACHE.popitem(last=False)
+        if not include_edges:
+            self.yaml_edges = []
+        self._nodes_by_id: Dict[str, dict] = {n["id"]: n for n in self.yaml_nodes}
+        # Tokenize node IDs once so rendering never re-splits them
+        self._resource_type: Dict[str, str] = {
+            n["id"]: n["id"].split("-", 1)[0] for n in self.yaml_nodes
+        }
+        self._id_tail: Dict[str, str] = {
+            n["id"]: n["id"].rsplit("-", 1)[-1] for n in self.yaml_nodes
+        }
+        # Render every label eagerly; emission then only does dict gets
+        self._labels: Dict[str, str] = {
+            n["id"]: self._build_label(n) for n in self.yaml_nodes
+        }
+        self._node_map: Dict[str, object] = {}
+        self._cluster_map: Dict[str, Cluster] = {}
 
     def generate(self, output_file: str):
         """Generate diagram from YAML description."""
@@ -90,93 +155,110 @@ class DiagramGenerator:
     def _get_cluster_nodes(self) -> Dict[str, set[str]]:
         """Get all nodes that should be in each cluster, including indirectly related nodes."""
         # Initialize with direct parent relationships
-        cluster_nodes: Dict[str, set[str]] = {}
+        cluster_nodes: Dict[str, set[str]] = defaultdict(set)
         for node in self.yaml_nodes:
             if parent := node.get("parent"):
-                if parent not in cluster_nodes:
-                    cluster_nodes[parent] = set()
                 cluster_nodes[parent].add(node["id"])
 
-        # Build adjacency list from edges
-        adjacency: Dict[str, set[str]] = {}
+        # Map every node id that appears in an edge to a dense integer so
+        # the traversal works over int lists instead of str-keyed hash
+        # tables — a large constant-factor memory and cache win on big
+        # graphs. Each edge is stored once in directed out/in lists; the
+        # owner array below dedupes visits, so undirected traversal just
+        # chains both lists.
+        index: Dict[str, int] = {}
         for edge in self.yaml_edges:
-            source = edge["source"]
-            target = edge["target"]
-            if source not in adjacency:
-                adjacency[source] = set()
-            if target not in adjacency:
-                adjacency[target] = set()
-            adjacency[source].add(target)
-            adjacency[target].add(source)  # Bidirectional for cluster membership
-
-        # For each cluster, add nodes that are connected to its members
-        changed = True
-        while changed:
-            changed = False
-            for cluster_id, members in cluster_nodes.items():
-                new_members = set()
-                for member in members:
-                    if member in adjacency:
-                        for connected in adjacency[member]:
-                            if connected not in members and not any(
-                                connected in other_members 
-                                for other_id, other_members in cluster_nodes.items() 
-                                if other_id != cluster_id
-                            ):
-                                new_members.add(connected)
-                if new_members:
-                    changed = True
-                    members.update(new_members)
+            for name in (edge["source"], edge["target"]):
+                if name not in index:
+                    index[name] = len(index)
+        names = list(index)
+        adj_out: List[List[int]] = [[] for _ in names]
+        adj_in: List[List[int]] = [[] for _ in names]
+        for edge in self.yaml_edges:
+            source = index[edge["source"]]
+            target = index[edge["target"]]
+            adj_out[source].append(target)
+            adj_in[target].append(source)
+
+        # Membership only grows and each node joins at most one cluster, so
+        # this is a multi-source BFS seeded with every cluster's direct
+        # members at once. The frontiers advance one hop per round, which
+        # preserves the old fixed-point loop's semantics: a node reachable
+        # from several clusters joins the nearest one, with round order
+        # breaking exact-distance ties. Still linear in nodes plus edges.
+        owner: List[Optional[str]] = [None] * len(names)
+        frontier: List[int] = []
+        for cluster_id, members in cluster_nodes.items():
+            for member in members:
+                if (i := index.get(member)) is not None:
+                    owner[i] = cluster_id
+                    frontier.append(i)
+        while frontier:
+            next_frontier: List[int] = []
+            for current in frontier:
+                cluster_id = owner[current]
+                for connected in chain(adj_out[current], adj_in[current]):
+                    if owner[connected] is None:
+                        owner[connected] = cluster_id
+                        cluster_nodes[cluster_id].add(names[connected])
+                        next_frontier.append(connected)
+            frontier = next_frontier
 
         return cluster_nodes
 
     def _get_resource_name(self, node_id: str) -> str:
         """Extract the resource name from node ID or identifier."""
         # Try to get from identifier first
-        node = next((n for n in self.yaml_nodes if n["id"] == node_id), None)
+        node = self._nodes_by_id.get(node_id)
         if node and (identifier := node.get("identifier")):
             # Extract resource name from terraform identifier (e.g., "aws_vpc.main" -> "main")
             return identifier.split(".")[-1]
-        
+
         # Fallback to node ID
-        parts = node_id.split("-")
-        return parts[-1] if len(parts) > 1 else node_id
+        return self._id_tail.get(node_id, node_id)
 
-    def _get_node_label(self, node_id: str) -> str:
-        """Get a two-line label with resource identifier and name."""
-        node = next((n for n in self.yaml_nodes if n["id"] == node_id), None)
-        if not node:
-            return node_id
+    def _build_label(self, node: dict) -> str:
+        """Build the two-line label with resource identifier and name."""
+        node_id = node["id"]
 
-        # Special handling for provider blocks
+        # Special handling for provider blocks, checked first with a cheap
+        # C-level prefix test before any identifier parsing
         if node_id.startswith("provider-"):
             # Extract provider name and region from identifier
             # e.g., "aws.provider.us-west-2" -> "aws\nus-west-2"
             if identifier := node.get("identifier"):
-                parts = identifier.split(".")
-                if len(parts) >= 3:
-                    return f"{parts[0]}\n{parts[-1]}"
+                head, _, tail = identifier.partition(".")
+                if "." in tail:
+                    return f"{head}\n{tail.rsplit('.', 1)[-1]}"
             return node_id
 
         # Get resource identifier (e.g., aws_vpc)
-        resource_type = node_id.split("-")[0]
-        
+        resource_type = self._resource_type[node_id]
+
         # Get resource name from identifier or node ID
         if identifier := node.get("identifier"):
             # Extract name from terraform identifier (e.g., "aws_vpc.main" -> "main")
             name = identifier.split(".")[-1]
         else:
             # Fallback to last part of node ID
-            parts = node_id.split("-")
-            name = parts[-1] if len(parts) > 1 else node_id
+            name = self._id_tail[node_id]
 
         return f"{resource_type}\n{name}"
 
+    def _get_node_label(self, node_id: str) -> str:
+        """Get the precomputed two-line label for a node."""
+        return self._labels.get(node_id, node_id)
+
     def _create_nodes(self):
         """Create diagram nodes from YAML description."""
         # First pass: create clusters and determine cluster membership
         cluster_nodes = self._get_cluster_nodes()
-        
+        node_to_cluster = {
+            member: cluster_id
+            for cluster_id, members in cluster_nodes.items()
+            for member in members
+        }
+
         # Create clusters first
         for node in self.yaml_nodes:
             node_id = node["id"]
@@ -185,45 +267,51 @@ class DiagramGenerator:
                 label = self._get_node_label(node_id)
                 self._get_or_create_cluster(node_id, label)
 
-        # Second pass: create nodes in their clusters
+        # Second pass: bucket nodes by owning cluster. Bind hot attributes
+        # to locals so the per-node loop avoids repeated attribute lookups.
+        node_map = self._node_map
+        resource_types = self._resource_type
+        get_label = self._get_node_label
+        get_cluster = node_to_cluster.get
+        buckets: Dict[Optional[str], List[str]] = defaultdict(list)
         for node in self.yaml_nodes:
             node_id = node["id"]
-            if node_id in self._node_map:
+            # Skip already-created nodes and the clusters themselves
+            if node_id in node_map or node_id in cluster_nodes:
                 continue
-
-            # Skip if this is a cluster itself
-            if node_id in cluster_nodes:
-                continue
-
-            # Use two-line label for nodes
-            label = self._get_node_label(node_id)
-            node_cluster = next(
-                (cluster_id for cluster_id, members in cluster_nodes.items() 
-                 if node_id in members),
-                None
+            buckets[get_cluster(node_id)].append(node_id)
+
+        # Create each cluster's nodes together so its graphviz context is
+        # entered exactly once rather than once per node.
+        for node_cluster, node_ids in buckets.items():
+            ctx = (
+                self._get_or_create_cluster(node_cluster, "")
+                if node_cluster else nullcontext()
             )
-
-            # Get node class based on resource type
-            resource_type = node_id.split("-")[0]
-            node_class = get_node_class(resource_type)
-            
-            if not node_class:
-                continue
-
-            # Create node in appropriate context
-            if node_cluster:
-                with self._get_or_create_cluster(node_cluster, ""):
-                    self._node_map[node_id] = node_class(label)
-            else:
-                self._node_map[node_id] = node_class(label)
+            with ctx:
+                for node_id in node_ids:
+                    node_class = get_node_class(resource_types[node_id])
+                    if node_class:
+                        node_map[node_id] = node_class(get_label(node_id))
 
     def _create_edges(self):
         """Create edges between nodes from YAML description."""
+        get = self._node_map.get
+        missing = []
         for edge in self.yaml_edges:
-            source = self._node_map.get(edge["source"])
-            target = self._node_map.get(edge["target"])
-            if source and target:
+            source = get(edge["source"])
+            target = get(edge["target"])
+            # "is not None" avoids __bool__ dispatch on diagrams nodes
+            if source is not None and target is not None:
                 source >> target
+            else:
+                missing.append((edge["source"], edge["target"]))
+        # One aggregated warning instead of per-edge output in the hot loop
+        if missing:
+            logger.warning(
+                "Skipped %d edges referencing unknown nodes: %s",
+                len(missing), missing[:10]
+            )
 
 
 def generate_diagram(diagram_file: Path, output_file: str = "infrastructure") -> None:
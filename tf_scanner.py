@@ -1,12 +1,19 @@
 #!/usr/bin/env python3
 
 import argparse
+import dbm
 import os
+import pickle
+import re
+import shelve
+import sys
 from abc import ABC, abstractmethod
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import Iterator, List, Optional
 
-from mappings import create_diagram_nodes, create_diagram_edges, write_diagram_yaml
+from mappings import create_diagram, write_diagram_yaml
 from models import FileInfo, ResourceBlock
 
 
@@ -16,18 +23,27 @@ class FileHandler(ABC):
         pass
 
     @abstractmethod
-    def process(self, file_path: Path) -> FileInfo:
+    def process(self, file_path: Path,
+                stats: Optional[os.stat_result] = None) -> FileInfo:
         pass
 
 
 class TerraformFileHandler(FileHandler):
-    def can_handle(self, file_path: Path) -> bool:
-        return file_path.suffix == '.tf'
+    SUFFIX = '.tf'
 
-    def process(self, file_path: Path) -> FileInfo:
-        stats = file_path.stat()
-        with file_path.open('r') as f:
-            content = f.read()
+    def can_handle(self, file_path: Path) -> bool:
+        # endswith on the name avoids the PurePath allocation .suffix makes
+        return file_path.name.endswith('.tf')
+
+    def process(self, file_path: Path,
+                stats: Optional[os.stat_result] = None) -> FileInfo:
+        # The scan loop passes the DirEntry's cached stat so matched files
+        # cost one stat syscall, not two
+        if stats is None:
+            stats = file_path.stat()
+        # read_bytes slurps the file in one read instead of paging it
+        # through the default 8 KB text buffer; Terraform is UTF-8 by spec
+        content = file_path.read_bytes().decode('utf-8')
         return FileInfo(
             path=file_path,
             size=stats.st_size,
@@ -37,13 +53,16 @@ class TerraformFileHandler(FileHandler):
 
 
 class TerraformVarsFileHandler(FileHandler):
+    SUFFIX = '.tfvars'
+
     def can_handle(self, file_path: Path) -> bool:
-        return file_path.suffix == '.tfvars'
+        return file_path.name.endswith('.tfvars')
 
-    def process(self, file_path: Path) -> FileInfo:
-        stats = file_path.stat()
-        with file_path.open('r') as f:
-            content = f.read()
+    def process(self, file_path: Path,
+                stats: Optional[os.stat_result] = None) -> FileInfo:
+        if stats is None:
+            stats = file_path.stat()
+        content = file_path.read_bytes().decode('utf-8')
         return FileInfo(
             path=file_path,
             size=stats.st_size,
@@ -55,71 +74,229 @@ class TerraformVarsFileHandler(FileHandler):
 class FileScanner:
     def __init__(self, handlers: List[FileHandler]):
         self.handlers = handlers
+        # O(1) dispatch on filename suffix; handlers that don't declare a
+        # SUFFIX keep the linear can_handle probing as a fallback
+        self._by_suffix = {
+            handler.SUFFIX: handler
+            for handler in handlers if getattr(handler, 'SUFFIX', None)
+        }
+        self._fallback = [
+            handler for handler in handlers if not getattr(handler, 'SUFFIX', None)
+        ]
 
     def scan_directory(self, directory: Path) -> List[FileInfo]:
-        results = []
-
-        for root, _, files in os.walk(directory):
-            for file in files:
-                file_path = Path(root) / file
-                for handler in self.handlers:
+        matched = []
+
+        for entry in self._iter_files(directory):
+            # Slice the suffix off the raw name; cheaper than splitext and
+            # consistent with it for dotless and dotfile names
+            name = entry.name
+            dot = name.rfind('.')
+            handler = self._by_suffix.get(name[dot:]) if dot > 0 else None
+            if handler is not None:
+                # entry.stat() reuses the data scandir already fetched, so
+                # the handler doesn't pay a second stat syscall
+                matched.append((handler, Path(entry.path), entry.stat()))
+                continue
+            if self._fallback:
+                file_path = Path(entry.path)
+                for handler in self._fallback:
                     if handler.can_handle(file_path):
-                        results.append(handler.process(file_path))
+                        matched.append((handler, file_path, entry.stat()))
                         break
 
-        return results
+        # Reading file contents is I/O-latency-bound, so overlap the reads
+        # in a thread pool once there are enough files to amortize startup
+        if len(matched) < 4:
+            return [handler.process(path, stats) for handler, path, stats in matched]
+        with ThreadPoolExecutor(max_workers=min(32, os.cpu_count() or 1)) as executor:
+            return list(executor.map(lambda match: match[0].process(match[1], match[2]), matched))
+
+    def _iter_files(self, directory: Path) -> Iterator[os.DirEntry]:
+        """Yield file entries below directory via os.scandir.
+
+        Iterative depth-first walk over a stack of plain path strings.
+        DirEntry reuses the type information the OS already returned with
+        the directory listing, so no extra stat calls are paid per entry,
+        and no generator frames stack up on deep trees. Unreadable or
+        concurrently-removed directories are skipped, matching os.walk's
+        default onerror=None behavior.
+        """
+        stack = [str(directory)]
+        while stack:
+            try:
+                entries = os.scandir(stack.pop())
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file():
+                        yield entry
+
+
+# One alternation finds resource headers and braces in a single C-level
+# pass over the whole file; block bodies are then sliced out by offset.
+# String literals and comments are matched as skip tokens so braces
+# inside them never disturb the depth count.
+_SCAN_RE = re.compile(
+    r'^[ \t]*resource[ \t]+"([^"]+)"[ \t]+"([^"]+)"'
+    r'|"(?:[^"\\\n]|\\.)*"'
+    r'|#[^\n]*'
+    r'|//[^\n]*'
+    r'|\{'
+    r'|\}',
+    re.MULTILINE
+)
+
+# First name attribute inside a block body; anchored so lines that merely
+# contain the word "name" (function_name, domain_name, ...) don't match
+_NAME_RE = re.compile(r'^[ \t]*name[ \t]*=[ \t]*"([^"]*)"', re.MULTILINE)
 
 
 def extract_resource_blocks(content: str) -> List[ResourceBlock]:
-    blocks = []
-    current_block = []
-    brace_count = 0
-    in_block = False
-    resource_type = None
-    resource_name = None
-
-    for line in content.splitlines():
-        stripped = line.strip()
-
-        if not in_block and stripped.startswith('resource'):
-            parts = stripped.split('"')
-            if len(parts) >= 4:
-                resource_type = parts[1]
-                resource_name = parts[3]
-                in_block = True
-
-        if in_block:
-            current_block.append(line)
-            brace_count += line.count('{')
-            brace_count -= line.count('}')
-
-            if brace_count == 0:
-                in_block = False
-                if resource_type and resource_name:
-                    block_content = '\n'.join(current_block)
-                    # Extract the actual name from the name field in the block
-                    actual_name = None
-                    for line in current_block:
-                        if 'name' in line and '=' in line:
-                            name_parts = line.split('=')
-                            if len(name_parts) >= 2:
-                                actual_name = name_parts[1].strip().strip('"')
-                                break
-
-                    blocks.append(ResourceBlock(
-                        type=resource_type,
-                        name=actual_name or resource_name,
-                        content=block_content,
-                        identifier=f"{resource_type}.{resource_name}"
-                    ))
-                current_block = []
-                resource_type = None
-                resource_name = None
+    # Variable/output/provider-only files are common; one C-level substring
+    # probe skips the regex scan entirely when no header can possibly match
+    if 'resource' not in content:
+        return []
+
+    blocks: List[ResourceBlock] = []
+    brace_count: int = 0
+    in_block: bool = False
+    resource_type: Optional[str] = None
+    resource_name: Optional[str] = None
+    start: int = 0
+
+    def finish(end: int) -> None:
+        nonlocal in_block, resource_type, resource_name
+        block_content = content[start:end]
+        # Extract the actual name from the name field in the block; one
+        # compiled search instead of a split per line
+        name_match = _NAME_RE.search(block_content)
+        actual_name = name_match.group(1) if name_match else None
+
+        identifier = f"{resource_type}.{resource_name}"
+        blocks.append(ResourceBlock(
+            type=resource_type,
+            name=actual_name or resource_name,
+            content=block_content,
+            identifier=identifier,
+            node_id=identifier.replace(".", "-")
+        ))
+        in_block = False
+        resource_type = None
+        resource_name = None
+
+    for match in _SCAN_RE.finditer(content):
+        # lastindex is only set for the header alternative's capture groups
+        if match.lastindex:
+            if in_block:
+                continue
+            # A scan sees the same handful of AWS type strings thousands of
+            # times; interning collapses them to shared objects so the
+            # histogram and edge lookups compare by pointer identity
+            resource_type = sys.intern(match.group(1))
+            resource_name = sys.intern(match.group(2))
+            in_block = True
+            brace_count = 0
+            # Block content starts at the beginning of the header line
+            start = content.rfind('\n', 0, match.start()) + 1
+            eol = content.find('\n', match.end())
+            if eol == -1:
+                eol = len(content)
+            # A header with no opening brace on its line closes right away,
+            # matching the previous line-by-line scanner
+            if '{' not in content[match.end():eol]:
+                finish(eol)
+        elif in_block:
+            # Peek at the source instead of materializing group(0) strings;
+            # tokens starting with a quote, '#' or '/' are skipped literals
+            char = content[match.start()]
+            if char == '{':
+                brace_count += 1
+            elif char == '}':
+                brace_count -= 1
+                if brace_count == 0:
+                    eol = content.find('\n', match.end())
+                    finish(eol if eol != -1 else len(content))
 
     return blocks
 
 
-def main():
+# Anything the cache layer can throw — a corrupt dbm file (dbm.dumb
+# surfaces that as ValueError), a truncated pickle, entries written by an
+# older ResourceBlock schema — must read as a miss, never abort the scan.
+# dbm.error is itself a tuple, so it is splatted in.
+_CACHE_ERRORS = (*dbm.error, OSError, EOFError, ValueError,
+                 pickle.PickleError, AttributeError, TypeError)
+
+
+def collect_blocks(results: List[FileInfo],
+                   cache_path: Optional[Path] = None) -> List[ResourceBlock]:
+    """Extract resource blocks from scanned files, in scan order.
+
+    When cache_path is given, parsed blocks are cached on disk keyed by
+    (size, mtime), so unchanged files skip extraction entirely on repeat
+    runs; any cache failure silently falls back to a fresh parse, and the
+    fresh result overwrites the bad entry. Extraction of the remaining
+    files is a pure function of their content, so large batches fan out
+    across cores; small ones stay sequential to dodge pool startup cost.
+    """
+    cache = None
+    if cache_path is not None:
+        try:
+            cache = shelve.open(str(cache_path))
+        except _CACHE_ERRORS:
+            cache = None
+
+    per_file: List[Optional[List[ResourceBlock]]] = []
+    misses: List[int] = []
+    try:
+        for file_info in results:
+            entry = None
+            if cache is not None:
+                try:
+                    entry = cache.get(str(file_info.path))
+                except _CACHE_ERRORS:
+                    entry = None
+            if (isinstance(entry, tuple) and len(entry) == 2
+                    and entry[0] == (file_info.size, file_info.modified_time)):
+                per_file.append(entry[1])
+            else:
+                misses.append(len(per_file))
+                per_file.append(None)
+
+        if len(misses) < 4:
+            parsed = [extract_resource_blocks(results[i].content) for i in misses]
+        else:
+            with ProcessPoolExecutor() as executor:
+                parsed = list(executor.map(
+                    extract_resource_blocks,
+                    (results[i].content for i in misses),
+                    chunksize=8
+                ))
+        for i, blocks in zip(misses, parsed):
+            per_file[i] = blocks
+            if cache is not None:
+                file_info = results[i]
+                try:
+                    cache[str(file_info.path)] = (
+                        (file_info.size, file_info.modified_time), blocks
+                    )
+                except _CACHE_ERRORS:
+                    pass
+    finally:
+        if cache is not None:
+            cache.close()
+
+    all_blocks: List[ResourceBlock] = []
+    for blocks in per_file:
+        all_blocks.extend(blocks)
+    return all_blocks
+
+
+def main() -> int:
     parser = argparse.ArgumentParser(
         description='Scan directory for Terraform files'
     )
@@ -132,6 +309,16 @@ def main():
         default='infrastructure',
         help='Output filename for the diagram (without extension)'
     )
+    parser.add_argument(
+        '--yaml-only',
+        action='store_true',
+        help='Write the diagram YAML but skip rendering the visual diagram'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Do not read or write the .tf_scanner_cache parse cache'
+    )
     args = parser.parse_args()
 
     scan_path = Path(args.directory)
@@ -147,26 +334,20 @@ def main():
     scanner = FileScanner(handlers)
     results = scanner.scan_directory(scan_path)
 
-    # Collect all blocks from all files
-    all_blocks = []
-
-    for file_info in results:
-        # Extract resource blocks from each file
-        blocks = extract_resource_blocks(file_info.content)
-        all_blocks.extend(blocks)
+    all_blocks = collect_blocks(
+        results,
+        None if args.no_cache else scan_path / '.tf_scanner_cache'
+    )
 
     # Print summary
     print(f"\nTotal resources found: {len(all_blocks)}")
     print("\nResource types:")
-    resource_types = {}
-    for block in all_blocks:
-        resource_types[block.type] = resource_types.get(block.type, 0) + 1
+    resource_types = Counter(block.type for block in all_blocks)
     for resource_type, count in sorted(resource_types.items()):
         print(f"  {resource_type}: {count}")
 
-    # Create diagram nodes and edges
-    nodes = create_diagram_nodes(all_blocks)
-    edges = create_diagram_edges(all_blocks)
+    # Create diagram nodes and edges in one pass over the blocks
+    nodes, edges = create_diagram(all_blocks)
     
     # Print edge summary
     print(f"\nTotal edges found: {len(edges)}")
@@ -178,14 +359,16 @@ def main():
     write_diagram_yaml(nodes, diagram_path, edges)
     print(f"\nDiagram YAML saved to {diagram_path}")
 
-    # Generate visual diagram if diagrams module is available
-    try:
-        from diagram_generator import generate_diagram
-        generate_diagram(diagram_path, args.output)
-        print(f"\nVisual diagram saved to {args.output}.png")
-    except ImportError:
-        print("\nWarning: diagrams module not available. Install it with: pip install diagrams")
-        print("Visual diagram generation skipped.")
+    # Generate visual diagram if requested and the diagrams module is
+    # available; --yaml-only skips the import and the graphviz render
+    if not args.yaml_only:
+        try:
+            from diagram_generator import generate_diagram
+            generate_diagram(diagram_path, args.output)
+            print(f"\nVisual diagram saved to {args.output}.png")
+        except ImportError:
+            print("\nWarning: diagrams module not available. Install it with: pip install diagrams")
+            print("Visual diagram generation skipped.")
 
     return 0
 